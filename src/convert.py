@@ -1,16 +1,24 @@
 #!/usr/bin/env python
 import argparse
 import base64
+import functools
 import json
 import logging
-import uuid
-import xmltodict
+import sys
 import os
 import gzip
 import datetime
+import pkg_resources
 import shutil
+from concurrent import futures
+from lxml import etree
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+import subprocess
 from utils import parse_hgvs, parse_splice
-from subprocess import call
 
 
 logging.basicConfig(level=logging.INFO,
@@ -18,30 +26,235 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 
-def read_xml(xml_file):
-    with open(xml_file) as fd:
-        return xmltodict.parse(fd.read())
+DATASET_SYSTEM = sys.intern('http://lifeomic.com/fhir/dataset')
+SOURCE_SYSTEM = sys.intern('http://lifeomic.com/fhir/source')
+VARIANT_TYPE_SYSTEM = sys.intern('http://lifeomic.com/fhir/variant-type')
+REPORT_SOURCE_SYSTEM = sys.intern('http://lifeomic.com/fhir/report-source')
+TASK_SERVICE = sys.intern('LifeOmic Task Service')
+
+GENETIC_ANALYSIS_MASTER_PANEL = sys.intern(
+    'Genetic analysis master panel-- This is the parent OBR for the panel holding all of the associated observations that can be reported with a molecular genetics analysis result.')
+
+# Constant sub-structures shared by reference across every observation in a
+# report; they are never mutated after creation.
+PANEL_CODE = {
+    'coding': [
+        {
+            'system': 'http://loinc.org',
+            'code': '55233-1',
+            'display': GENETIC_ANALYSIS_MASTER_PANEL
+        }
+    ]
+}
+
+SOMATIC_EXTENSION = {
+    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsGenomicSourceClass',
+    'valueCodeableConcept': {
+        'coding': [
+            {
+                'system': 'http://loinc.org',
+                'code': '48002-0',
+                'display': 'somatic'
+            }
+        ]
+    }
+}
+
+
+def codeable_concept(system, code, display):
+    return {
+        'coding': [
+            {
+                'system': system,
+                'code': code,
+                'display': display
+            }
+        ]
+    }
+
+
+def genetics_extension(url, system, code, display):
+    return {
+        'url': url,
+        'valueCodeableConcept': codeable_concept(system, code, display)
+    }
+
+
+_UUID_BATCH_SIZE = 64
+
+
+def _uuid_batch():
+    while True:
+        data = bytearray(os.urandom(16 * _UUID_BATCH_SIZE))
+        for i in range(0, len(data), 16):
+            chunk = data[i:i + 16]
+            chunk[6] = (chunk[6] & 0x0f) | 0x40  # version 4
+            chunk[8] = (chunk[8] & 0x3f) | 0x80  # RFC 4122 variant
+            encoded = chunk.hex()
+            yield '{}-{}-{}-{}-{}'.format(encoded[:8], encoded[8:12],
+                                          encoded[12:16], encoded[16:20], encoded[20:])
+
+
+_uuids = _uuid_batch()
+
+
+def new_resource_id():
+    return next(_uuids)
+
+
+def observation_meta(project_id, variant_type):
+    return {
+        'tag': [
+            {
+                'system': DATASET_SYSTEM,
+                'code': project_id
+            },
+            {
+                'system': SOURCE_SYSTEM,
+                'code': TASK_SERVICE
+            },
+            {
+                'system': VARIANT_TYPE_SYSTEM,
+                'code': variant_type
+            },
+            {
+                'system': REPORT_SOURCE_SYSTEM,
+                'code': 'Foundation'
+            }
+        ]
+    }
+
+
+_PDF_CHUNK_SIZE = 1 << 20  # base64 text decoded per chunk
+
+
+def write_pdf(encoded_pdf, pdf_out_file):
+    with open(pdf_out_file, 'wb', buffering=_COPY_BUFFER_SIZE) as pdf_file:
+        pending = ''
+        for start in range(0, len(encoded_pdf), _PDF_CHUNK_SIZE):
+            # Strip embedded whitespace so every decode gets a 4-aligned block
+            chunk = pending + ''.join(encoded_pdf[start:start + _PDF_CHUNK_SIZE].split())
+            usable = len(chunk) - len(chunk) % 4
+            pdf_file.write(base64.b64decode(chunk[:usable]))
+            pending = chunk[usable:]
+        if pending:
+            pdf_file.write(base64.b64decode(pending))
+    logger.info('Saved PDF report to %s', pdf_out_file)
+
+
+def element_to_dict(elem):
+    result = {}
+    for name, value in elem.attrib.items():
+        result['@{}'.format(name)] = value
+    for child in elem:
+        if not isinstance(child.tag, str):
+            continue
+        name = etree.QName(child).localname
+        value = element_to_dict(child)
+        if name in result:
+            existing = result[name]
+            if isinstance(existing, list):
+                existing.append(value)
+            else:
+                result[name] = [existing, value]
+        else:
+            result[name] = value
+    text = elem.text.strip() if elem.text else ''
+    if not result:
+        return text or None
+    if text:
+        result['#text'] = text
+    return result
+
+
+def read_xml(xml_file, pdf_out_file=None):
+    payload = {}
+
+    with open(xml_file, 'rb', buffering=_COPY_BUFFER_SIZE) as fd:
+        for _, elem in etree.iterparse(fd, events=('end',)):
+            parent = elem.getparent()
+            if parent is None or etree.QName(parent).localname != 'ResultsPayload':
+                continue
+            name = etree.QName(elem).localname
+            if name == 'ReportPDF':
+                if pdf_out_file is not None:
+                    write_pdf(elem.text, pdf_out_file)
+            else:
+                payload[name] = element_to_dict(elem)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+    return payload
 
 
 def save_json(fhir_resources, out_file):
-    with open(out_file, 'wb') as fd:
-        json.dump(fhir_resources, fd, indent=4)
+    # Encode one resource at a time so the whole bundle never has to be
+    # serialized into a single in-memory string.
+    if orjson is not None:
+        def encode(resource):
+            return orjson.dumps(resource, option=orjson.OPT_INDENT_2)
+    else:
+        def encode(resource):
+            return json.dumps(resource, indent=2).encode('utf-8')
+
+    with open(out_file, 'wb', buffering=_COPY_BUFFER_SIZE) as fd:
+        fd.write(b'[')
+        for index, resource in enumerate(fhir_resources):
+            if index:
+                fd.write(b',')
+            fd.write(encode(resource))
+        fd.write(b']')
+
+
+_COPY_BUFFER_SIZE = 1 << 18  # 256 KiB
+
+
+def pyfaidx_supports_bgzf():
+    # pyfaidx reads bgzipped FASTA natively since 0.5.5.2
+    # https://github.com/mdshw5/pyfaidx/issues/125
+    try:
+        version = pkg_resources.get_distribution('pyfaidx').version
+    except Exception:
+        return False
+    return pkg_resources.parse_version(version) >= pkg_resources.parse_version('0.5.5.2')
 
 
 def unzip(zipped_file):
     unzipped_file = os.path.splitext(zipped_file)[0]
     logger.info('Unzipping %s to %s', zipped_file, unzipped_file)
 
-    with gzip.open(zipped_file, "rb") as f_in, open(unzipped_file, "wb") as f_out:
-        shutil.copyfileobj(f_in, f_out)
+    with gzip.open(zipped_file, "rb") as f_in, \
+            open(unzipped_file, "wb", buffering=_COPY_BUFFER_SIZE) as f_out:
+        shutil.copyfileobj(f_in, f_out, length=_COPY_BUFFER_SIZE)
 
     logger.info('Unzipping completed')
     return unzipped_file
 
 
 def create_microsatallite_observation(project_id, subject_id, specimen_id, effective_date, specimen_name, sequence_id):
+    meta = observation_meta(project_id, 'microsatellite-instability')
+
+    subject_ref = {'reference': f'Patient/{subject_id}'}
+
+    specimen_ref = None
+    if specimen_id is not None:
+        specimen_ref = {
+            'display': specimen_name,
+            'reference': f'Specimen/{specimen_id}'
+        }
+
+    sequence_extension = None
+    if sequence_id is not None:
+        sequence_extension = {
+            'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
+            'valueReference': {
+                'reference': f'Sequence/{sequence_id}'
+            }
+        }
+
     def create(variant_dict):
-        observation_id = str(uuid.uuid4())
+        observation_id = new_resource_id()
 
         values = {
             'MSI-H': 'MSI-H',
@@ -60,26 +273,7 @@ def create_microsatallite_observation(project_id, subject_id, specimen_id, effec
         observation = {
             'resourceType': 'Observation',
             'effectiveDateTime': effective_date,
-            'meta': {
-                'tag': [
-                    {
-                        'system': 'http://lifeomic.com/fhir/dataset',
-                        'code': project_id
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/source',
-                        'code': 'LifeOmic Task Service'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/variant-type',
-                        'code': 'microsatellite-instability'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/report-source',
-                        'code': 'Foundation'
-                    }
-                ]
-            },
+            'meta': meta,
             'code': {
                 'coding': [
                     {
@@ -90,9 +284,7 @@ def create_microsatallite_observation(project_id, subject_id, specimen_id, effec
                 ]
             },
             'status': 'final',
-            'subject': {
-                'reference': 'Patient/{}'.format(subject_id)
-            },
+            'subject': subject_ref,
             'valueCodeableConcept': {
                 'coding': [
                     {
@@ -108,26 +300,38 @@ def create_microsatallite_observation(project_id, subject_id, specimen_id, effec
             'id': observation_id
         }
 
-        if specimen_id is not None:
-            observation['specimen'] = {
-                'display': specimen_name,
-                'reference': 'Specimen/{}'.format(specimen_id)
-            }
+        if specimen_ref is not None:
+            observation['specimen'] = specimen_ref
 
-        if sequence_id is not None:
-             observation['extension'].append({
-                'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
-                'valueReference': {
-                    'reference': 'Sequence/{}'.format(sequence_id)
-                }
-            })
+        if sequence_extension is not None:
+            observation['extension'].append(sequence_extension)
         return observation
     return create
 
 
 def create_tumor_mutation_observation(project_id, subject_id, specimen_id, effective_date, specimen_name, sequence_id):
+    meta = observation_meta(project_id, 'tumor-mutation-burden')
+
+    subject_ref = {'reference': f'Patient/{subject_id}'}
+
+    specimen_ref = None
+    if specimen_id is not None:
+        specimen_ref = {
+            'display': specimen_name,
+            'reference': f'Specimen/{specimen_id}'
+        }
+
+    sequence_extension = None
+    if sequence_id is not None:
+        sequence_extension = {
+            'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
+            'valueReference': {
+                'reference': f'Sequence/{sequence_id}'
+            }
+        }
+
     def create(variant_dict):
-        observation_id = str(uuid.uuid4())
+        observation_id = new_resource_id()
 
         codes = {
             'high': 'TMB-H',
@@ -139,26 +343,7 @@ def create_tumor_mutation_observation(project_id, subject_id, specimen_id, effec
         observation = {
             'resourceType': 'Observation',
             'effectiveDateTime': effective_date,
-            'meta': {
-                'tag': [
-                    {
-                        'system': 'http://lifeomic.com/fhir/dataset',
-                        'code': project_id
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/source',
-                        'code': 'LifeOmic Task Service'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/variant-type',
-                        'code': 'tumor-mutation-burden'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/report-source',
-                        'code': 'Foundation'
-                    }
-                ]
-            },
+            'meta': meta,
             'code': {
                 'coding': [
                 {
@@ -169,9 +354,7 @@ def create_tumor_mutation_observation(project_id, subject_id, specimen_id, effec
                 ]
             },
             'status': 'final',
-            'subject': {
-                'reference': 'Patient/{}'.format(subject_id)
-            },
+            'subject': subject_ref,
              'extension': [
 
             ],
@@ -215,62 +398,45 @@ def create_tumor_mutation_observation(project_id, subject_id, specimen_id, effec
             'id': observation_id
         }
 
-        if specimen_id is not None:
-            observation['specimen'] = {
-                'display': specimen_name,
-                'reference': 'Specimen/{}'.format(specimen_id)
-            }
+        if specimen_ref is not None:
+            observation['specimen'] = specimen_ref
 
-        if sequence_id is not None:
-            observation['extension'].append({
-                'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
-                'valueReference': {
-                    'reference': 'Sequence/{}'.format(sequence_id)
-                }
-            })
+        if sequence_extension is not None:
+            observation['extension'].append(sequence_extension)
         return observation
     return create
 
 
 def create_rearrangement_observation(project_id, subject_id, specimen_id, specimen_name, sequence_id):
+    meta = observation_meta(project_id, 'rearrangement')
+
+    subject_ref = {'reference': f'Patient/{subject_id}'}
+
+    specimen_ref = None
+    if specimen_id is not None:
+        specimen_ref = {
+            'display': specimen_name,
+            'reference': f'Specimen/{specimen_id}'
+        }
+
+    sequence_extension = None
+    if sequence_id is not None:
+        sequence_extension = {
+            'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
+            'valueReference': {
+                'reference': f'Sequence/{sequence_id}'
+            }
+        }
+
     def create(variant_dict):
-        observation_id = str(uuid.uuid4())
+        observation_id = new_resource_id()
 
         observation = {
             'resourceType': 'Observation',
-            'meta': {
-                'tag': [
-                    {
-                        'system': 'http://lifeomic.com/fhir/dataset',
-                        'code': project_id
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/source',
-                        'code': 'LifeOmic Task Service'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/variant-type',
-                        'code': 'rearrangement'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/report-source',
-                        'code': 'Foundation'
-                    }
-                ]
-            },
-            'code': {
-                'coding': [
-                {
-                    'system': 'http://loinc.org',
-                    'code': '55233-1',
-                    'display': 'Genetic analysis master panel-- This is the parent OBR for the panel holding all of the associated observations that can be reported with a molecular genetics analysis result.'
-                }
-                ]
-            },
+            'meta': meta,
+            'code': PANEL_CODE,
             'status': 'final',
-            'subject': {
-                'reference': 'Patient/{}'.format(subject_id)
-            },
+            'subject': subject_ref,
             'valueCodeableConcept': {
                 'coding': [
                     {
@@ -333,187 +499,83 @@ def create_rearrangement_observation(project_id, subject_id, specimen_id, specim
             'id': observation_id
         }
 
-        if specimen_id is not None:
-            observation['specimen'] = {
-                'display': specimen_name,
-                'reference': 'Specimen/{}'.format(specimen_id)
-            }
+        if specimen_ref is not None:
+            observation['specimen'] = specimen_ref
 
-        if sequence_id is not None:
-            observation['extension'].append({
-                'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
-                'valueReference': {
-                    'reference': 'Sequence/{}'.format(sequence_id)
-                }
-            })
+        if sequence_extension is not None:
+            observation['extension'].append(sequence_extension)
         return observation
     return create
 
 
 def create_copy_number_observation(project_id, subject_id, specimen_id, specimen_name, sequence_id):
+    meta = observation_meta(project_id, 'copy-number')
+
+    subject_ref = {'reference': f'Patient/{subject_id}'}
+
+    specimen_ref = None
+    if specimen_id is not None:
+        specimen_ref = {
+            'display': specimen_name,
+            'reference': f'Specimen/{specimen_id}'
+        }
+
+    sequence_extension = None
+    if sequence_id is not None:
+        sequence_extension = {
+            'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
+            'valueReference': {
+                'reference': f'Sequence/{sequence_id}'
+            }
+        }
+
     def create(variant_dict):
-        observation_id = str(uuid.uuid4())
+        observation_id = new_resource_id()
+        status = variant_dict['@status']
+        gene = variant_dict['@gene']
+        copy_type = variant_dict['@type']
+        copy_number = variant_dict['@copy-number']
+        number_of_exons = variant_dict['@number-of-exons']
         position_value = variant_dict['@position']
-        region, position = position_value.split(':')
+        region, position = position_value.split(':', 1)
 
         observation = {
             'resourceType': 'Observation',
-            'meta': {
-                'tag': [
-                    {
-                        'system': 'http://lifeomic.com/fhir/dataset',
-                        'code': project_id
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/source',
-                        'code': 'LifeOmic Task Service'
-                    },
-                     {
-                        'system': 'http://lifeomic.com/fhir/variant-type',
-                        'code': 'copy-number'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/report-source',
-                        'code': 'Foundation'
-                    }
-                ]
-            },
-            'code': {
-                'coding': [
-                {
-                    'system': 'http://loinc.org',
-                    'code': '55233-1',
-                    'display': 'Genetic analysis master panel-- This is the parent OBR for the panel holding all of the associated observations that can be reported with a molecular genetics analysis result.'
-                }
-                ]
-            },
+            'meta': meta,
+            'code': PANEL_CODE,
             'status': 'final',
-            'subject': {
-                'reference': 'Patient/{}'.format(subject_id)
-            },
-            'valueCodeableConcept': {
-                'coding': [
-                    {
-                    'system': 'http://foundationmedicine.com',
-                    'code': variant_dict['@status'],
-                    'display': 'Foundation - {}'.format(variant_dict['@status'].title())
-                    }
-                ]
-            },
+            'subject': subject_ref,
+            'valueCodeableConcept': codeable_concept(
+                'http://foundationmedicine.com', status,
+                'Foundation - {}'.format(status.title())),
             'extension': [
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsGene',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://www.genenames.org',
-                                'code': '1100',
-                                'display': variant_dict['@gene']
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsDNASequenceVariantName',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48004-6',
-                                'display': '{}: CN={}'.format(variant_dict['@type'].title(), variant_dict['@copy-number'])
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsGenomicSourceClass',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48002-0',
-                                'display': 'somatic'
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAPosition',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48001-2',
-                                'display': position
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAChromosome',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '47999-8',
-                                'display': region
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsCopyNumberEvent',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://www.sequenceontology.org',
-                                'code': 'SO:0001019',
-                                'display': variant_dict['@type'].capitalize()
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeName',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48005-3',
-                                'display': 'Exons {}'.format(variant_dict['@number-of-exons'])
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-copyNumber',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://lifeomic.com',
-                                'code': 'copyNumber',
-                                'display': variant_dict['@copy-number']
-                            }
-                        ]
-                    }
-                }
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsGene',
+                                   'http://www.genenames.org', '1100', gene),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsDNASequenceVariantName',
+                                   'http://loinc.org', '48004-6',
+                                   '{}: CN={}'.format(copy_type.title(), copy_number)),
+                SOMATIC_EXTENSION,
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAPosition',
+                                   'http://loinc.org', '48001-2', position),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAChromosome',
+                                   'http://loinc.org', '47999-8', region),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsCopyNumberEvent',
+                                   'http://www.sequenceontology.org', 'SO:0001019',
+                                   copy_type.capitalize()),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeName',
+                                   'http://loinc.org', '48005-3',
+                                   'Exons {}'.format(number_of_exons)),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-copyNumber',
+                                   'http://lifeomic.com', 'copyNumber', copy_number)
             ],
             'id': observation_id
         }
 
-        if specimen_id is not None:
-            observation['specimen'] = {
-                'display': specimen_name,
-                'reference': 'Specimen/{}'.format(specimen_id)
-            }
+        if specimen_ref is not None:
+            observation['specimen'] = specimen_ref
 
-        if sequence_id is not None:
-            observation['extension'].append({
-                'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
-                'valueReference': {
-                    'reference': 'Sequence/{}'.format(sequence_id)
-                }
-            })
+        if sequence_extension is not None:
+            observation['extension'].append(sequence_extension)
         return observation
     return create
 
@@ -528,18 +590,63 @@ def hgvs_2_vcf (variant_name, genes, functional_effect, cds_effect, position_val
             return parse_splice(cds_effect, position_value, strand, fasta)
 
 
-def create_observation(fasta, genes, project_id, subject_id, specimen_id, specimen_name, sequence_id):
-    def create(variant_dict):
-        observation_id = str(uuid.uuid4())
-        position_value = variant_dict['@position']
+def resolve_variant(variant_dict, fasta, genes):
+    cds_effect = variant_dict['@cds-effect'].replace('&gt;', '>')
+    variant_name = '{}:c.{}'.format(variant_dict['@transcript'], cds_effect)
+    chrom, offset, ref, alt = hgvs_2_vcf(variant_name, genes, variant_dict['@functional-effect'],
+                                         cds_effect, variant_dict['@position'], variant_dict['@strand'], fasta)
+    depth = int(variant_dict['@depth'])
+    allele_fraction = float(variant_dict['@allele-fraction'])
+    variant_read_count = int(depth * allele_fraction + 0.5)
+    return variant_dict, variant_name, chrom, offset, ref, alt, variant_read_count
+
+
+# Below this many variants the pool startup costs more than it saves.
+_PARALLEL_THRESHOLD = 16
+
+
+def resolve_variants(variants, fasta, genes):
+    if len(variants) < _PARALLEL_THRESHOLD:
+        return [resolve_variant(variant_dict, fasta, genes) for variant_dict in variants]
+
+    resolver = functools.partial(resolve_variant, fasta=fasta, genes=genes)
+    with futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        return list(executor.map(resolver, variants, chunksize=32))
+
+
+def create_observation(project_id, subject_id, specimen_id, specimen_name, sequence_id):
+    meta = observation_meta(project_id, 'short')
+
+    subject_ref = {'reference': f'Patient/{subject_id}'}
+
+    specimen_ref = None
+    if specimen_id is not None:
+        specimen_ref = {
+            'display': specimen_name,
+            'reference': f'Specimen/{specimen_id}'
+        }
+
+    sequence_extension = None
+    if sequence_id is not None:
+        sequence_extension = {
+            'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
+            'valueReference': {
+                'reference': f'Sequence/{sequence_id}'
+            }
+        }
+
+    def create(variant_record):
+        variant_dict, variant_name, chrom, offset, ref, alt, variant_read_count = variant_record
+        observation_id = new_resource_id()
+        status = variant_dict['@status']
+        gene = variant_dict['@gene']
         functional_effect = variant_dict['@functional-effect']
-        strand = variant_dict['@strand']
-        region, position = position_value.split(':')
+        protein_effect = variant_dict['@protein-effect']
+        allele_fraction = variant_dict['@allele-fraction']
+        depth = variant_dict['@depth']
         transcript = variant_dict['@transcript']
-        cds_effect = variant_dict['@cds-effect'].replace('&gt;', '>')
-        variant_name = '{}:c.{}'.format(transcript, cds_effect)
-        chrom, offset, ref, alt = hgvs_2_vcf(variant_name, genes, functional_effect, cds_effect, position_value, strand, fasta)
-        variantReadCount = int(round(int(variant_dict['@depth']) * float(variant_dict['@allele-fraction'])))
+        position_value = variant_dict['@position']
+        region, position = position_value.split(':', 1)
 
         observation = {
             'resourceType': 'Observation',
@@ -547,205 +654,51 @@ def create_observation(fasta, genes, project_id, subject_id, specimen_id, specim
                 'system': 'https://lifeomic.com/observation/genetic',
                 'value': '{}:{}:{}:{}'.format(chrom, offset, ref, alt)
             }],
-            'meta': {
-                'tag': [
-                    {
-                        'system': 'http://lifeomic.com/fhir/dataset',
-                        'code': project_id
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/source',
-                        'code': 'LifeOmic Task Service'
-                    },
-                     {
-                        'system': 'http://lifeomic.com/fhir/variant-type',
-                        'code': 'short'
-                    },
-                    {
-                        'system': 'http://lifeomic.com/fhir/report-source',
-                        'code': 'Foundation'
-                    }
-                ]
-            },
-            'code': {
-                'coding': [
-                {
-                    'system': 'http://loinc.org',
-                    'code': '55233-1',
-                    'display': 'Genetic analysis master panel-- This is the parent OBR for the panel holding all of the associated observations that can be reported with a molecular genetics analysis result.'
-                }
-                ]
-            },
+            'meta': meta,
+            'code': PANEL_CODE,
             'status': 'final',
-            'subject': {
-                'reference': 'Patient/{}'.format(subject_id)
-            },
-            'valueCodeableConcept': {
-                'coding': [
-                    {
-                    'system': 'http://foundationmedicine.com',
-                    'code': variant_dict['@status'],
-                    'display': 'Foundation - {}'.format(variant_dict['@status'].title())
-                    }
-                ]
-            },
+            'subject': subject_ref,
+            'valueCodeableConcept': codeable_concept(
+                'http://foundationmedicine.com', status,
+                'Foundation - {}'.format(status.title())),
             'extension': [
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsGene',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://www.genenames.org',
-                                'code': '1100',
-                                'display': variant_dict['@gene']
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsDNASequenceVariantName',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48004-6',
-                                'display': variant_name
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeType',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://snomed.info/sct',
-                                'code': 'LL380-7',
-                                'display': variant_dict['@functional-effect']
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeName',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48005-3',
-                                'display': 'p.{}'.format(variant_dict['@protein-effect'])
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsAllelicFrequency',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '81258-6',
-                                'display': variant_dict['@allele-fraction']
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsGenomicSourceClass',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48002-0',
-                                'display': 'somatic'
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAPosition',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '48001-2',
-                                'display': position
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAChromosome',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '47999-8',
-                                'display': region
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsTotalReadDepth',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '82121-5',
-                                'display': variant_dict['@depth']
-                            }
-                        ]
-                    }
-                },
-                {
-                    "url": "http://lifeomic.com/fhir/StructureDefinition/observation-geneticsVariantReadCount",
-                    "valueCodeableConcept": {
-                        "coding": [
-                            {
-                                "system": "http://loinc.org",
-                                "code": "82121-5",
-                                "display": str(variantReadCount)
-                            }
-                        ]
-                    }
-                },
-                {
-                    'url': 'http://lifeomic.com/fhir/StructureDefinition/observation-geneticsTranscriptID',
-                    'valueCodeableConcept': {
-                        'coding': [
-                            {
-                                'system': 'http://loinc.org',
-                                'code': '51958-7',
-                                'display': variant_dict['@transcript']
-                            }
-                        ]
-                    }
-                }
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsGene',
+                                   'http://www.genenames.org', '1100', gene),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsDNASequenceVariantName',
+                                   'http://loinc.org', '48004-6', variant_name),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeType',
+                                   'http://snomed.info/sct', 'LL380-7', functional_effect),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsAminoAcidChangeName',
+                                   'http://loinc.org', '48005-3', 'p.{}'.format(protein_effect)),
+                genetics_extension('http://hl7.org/fhir/StructureDefinition/observation-geneticsAllelicFrequency',
+                                   'http://loinc.org', '81258-6', allele_fraction),
+                SOMATIC_EXTENSION,
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAPosition',
+                                   'http://loinc.org', '48001-2', position),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsDNAChromosome',
+                                   'http://loinc.org', '47999-8', region),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsTotalReadDepth',
+                                   'http://loinc.org', '82121-5', depth),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsVariantReadCount',
+                                   'http://loinc.org', '82121-5', str(variant_read_count)),
+                genetics_extension('http://lifeomic.com/fhir/StructureDefinition/observation-geneticsTranscriptID',
+                                   'http://loinc.org', '51958-7', transcript)
             ],
             'id': observation_id
         }
 
-        if specimen_id is not None:
-            observation['specimen'] = {
-                'display': specimen_name,
-                'reference': 'Specimen/{}'.format(specimen_id)
-            }
+        if specimen_ref is not None:
+            observation['specimen'] = specimen_ref
 
-        if sequence_id is not None:
-            observation['extension'].append({
-                'url': 'http://hl7.org/fhir/StructureDefinition/observation-geneticsSequence',
-                'valueReference': {
-                    'reference': 'Sequence/{}'.format(sequence_id)
-                }
-            })
+        if sequence_extension is not None:
+            observation['extension'].append(sequence_extension)
         return observation
     return create
 
 
 def create_report(results_payload_dict, project_id, subject_id, specimen_id, specimen_name, effective_date,
                   file_url=None, sequence_id=None):
-    report_id = str(uuid.uuid4())
+    report_id = new_resource_id()
 
     report = {
         'resourceType': 'DiagnosticReport',
@@ -808,7 +761,7 @@ def create_report(results_payload_dict, project_id, subject_id, specimen_id, spe
 
 
 def create_subject(results_payload_dict, project_id):
-    subject_id = str(uuid.uuid4())
+    subject_id = new_resource_id()
     pmi_dict = results_payload_dict['FinalReport']['PMI']
 
     subject = {
@@ -847,7 +800,7 @@ def create_subject(results_payload_dict, project_id):
 
 
 def create_sequence(project_id, subject_id, specimen_id, specimen_name):
-    sequence_id = str(uuid.uuid4())
+    sequence_id = new_resource_id()
 
     sequence = {
         'resourceType': 'Sequence',
@@ -884,6 +837,14 @@ def create_sequence(project_id, subject_id, specimen_id, specimen_name):
     return sequence, sequence_id
 
 
+def get_short_variants(results_payload_dict):
+    short_variants = results_payload_dict['variant-report'].get('short-variants')
+    if short_variants is not None and 'short-variant' in short_variants:
+        variants_dict = short_variants['short-variant']
+        return variants_dict if isinstance(variants_dict, list) else [variants_dict]
+    return []
+
+
 def get_specimen_name(results_payload_dict):
     specimen_name = None
     if isinstance(results_payload_dict['variant-report']['samples']['sample'], list):
@@ -897,7 +858,7 @@ def get_specimen_name(results_payload_dict):
 
 def create_specimen(results_payload_dict, project_id, subject_id):
     specimen_name = get_specimen_name(results_payload_dict)
-    specimen_id = str(uuid.uuid4())
+    specimen_id = new_resource_id()
 
     specimen = {
         'resourceType': 'Specimen',
@@ -930,68 +891,84 @@ def create_specimen(results_payload_dict, project_id, subject_id):
     return specimen, specimen_id, specimen_name
 
 
-def write_vcf(variants, specimen_name, fasta, genes, vcf_out_file):
-    with open('./unsorted.vcf', 'w+') as vcf_file:
-        vcf_file.write('##fileformat=VCFv4.2\n')
-        vcf_file.write('##source=foundation-xml-fhir\n')
-        vcf_file.write('##reference=file://{}\n'.format(fasta))
-        vcf_file.write('##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">\n')
-        vcf_file.write('##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">\n')
-        vcf_file.write('##INFO=<ID=VENDSIG,Number=1,Type=String,Description="Vendor Significance">\n')
-        vcf_file.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
-        vcf_file.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">\n')
-        vcf_file.write('##FORMAT=<ID=AD,Number=.,Type=Integer,Description="Number of reads harboring allele (in order specified by GT)">\n')
-        vcf_file.write('##contig=<ID=chr1,length=248956422>\n')
-        vcf_file.write('##contig=<ID=chr2,length=242193529>\n')
-        vcf_file.write('##contig=<ID=chr3,length=198295559>\n')
-        vcf_file.write('##contig=<ID=chr4,length=190214555>\n')
-        vcf_file.write('##contig=<ID=chr5,length=181538259>\n')
-        vcf_file.write('##contig=<ID=chr6,length=170805979>\n')
-        vcf_file.write('##contig=<ID=chr7,length=159345973>\n')
-        vcf_file.write('##contig=<ID=chr8,length=145138636>\n')
-        vcf_file.write('##contig=<ID=chr9,length=138394717>\n')
-        vcf_file.write('##contig=<ID=chr10,length=133797422>\n')
-        vcf_file.write('##contig=<ID=chr11,length=135086622>\n')
-        vcf_file.write('##contig=<ID=chr12,length=133275309>\n')
-        vcf_file.write('##contig=<ID=chr13,length=114364328>\n')
-        vcf_file.write('##contig=<ID=chr14,length=107043718>\n')
-        vcf_file.write('##contig=<ID=chr15,length=101991189>\n')
-        vcf_file.write('##contig=<ID=chr16,length=90338345>\n')
-        vcf_file.write('##contig=<ID=chr17,length=83257441>\n')
-        vcf_file.write('##contig=<ID=chr18,length=80373285>\n')
-        vcf_file.write('##contig=<ID=chr19,length=58617616>\n')
-        vcf_file.write('##contig=<ID=chr20,length=64444167>\n')
-        vcf_file.write('##contig=<ID=chr21,length=46709983>\n')
-        vcf_file.write('##contig=<ID=chr22,length=50818468>\n')
-        vcf_file.write('##contig=<ID=chrX,length=156040895>\n')
-        vcf_file.write('##contig=<ID=chrY,length=57227415>\n')
-        vcf_file.write('##contig=<ID=chrM,length=16569>\n')
-        vcf_file.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t{}\n'.format(specimen_name))
-
-        status = {
-            'known': 'Pathogenic',
-            'likley': 'Likely_pathogenic',
-            'unknown': 'Uncertain_significance',
-            'ambiguous': 'other'
-        }
-
-        for variant_dict in variants:
-            vendsig = status.get(variant_dict.get('@status', 'unknown'))
-            cds_effect = variant_dict['@cds-effect'].replace('&gt;', '>')
-            transcript = variant_dict['@transcript']
-            functional_effect = variant_dict['@functional-effect']
-            strand = variant_dict['@strand']
-            position_value = variant_dict['@position']
+VCF_HEADER = (  # precomputed once; two %s slots for the reference path and sample name
+    b'##fileformat=VCFv4.2\n'
+    b'##source=foundation-xml-fhir\n'
+    b'##reference=file://%s\n'
+    b'##INFO=<ID=DP,Number=1,Type=Integer,Description="Total Depth">\n'
+    b'##INFO=<ID=AF,Number=A,Type=Float,Description="Allele Frequency">\n'
+    b'##INFO=<ID=VENDSIG,Number=1,Type=String,Description="Vendor Significance">\n'
+    b'##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n'
+    b'##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read Depth">\n'
+    b'##FORMAT=<ID=AD,Number=.,Type=Integer,Description="Number of reads harboring allele (in order specified by GT)">\n'
+    b'##contig=<ID=chr1,length=248956422>\n'
+    b'##contig=<ID=chr2,length=242193529>\n'
+    b'##contig=<ID=chr3,length=198295559>\n'
+    b'##contig=<ID=chr4,length=190214555>\n'
+    b'##contig=<ID=chr5,length=181538259>\n'
+    b'##contig=<ID=chr6,length=170805979>\n'
+    b'##contig=<ID=chr7,length=159345973>\n'
+    b'##contig=<ID=chr8,length=145138636>\n'
+    b'##contig=<ID=chr9,length=138394717>\n'
+    b'##contig=<ID=chr10,length=133797422>\n'
+    b'##contig=<ID=chr11,length=135086622>\n'
+    b'##contig=<ID=chr12,length=133275309>\n'
+    b'##contig=<ID=chr13,length=114364328>\n'
+    b'##contig=<ID=chr14,length=107043718>\n'
+    b'##contig=<ID=chr15,length=101991189>\n'
+    b'##contig=<ID=chr16,length=90338345>\n'
+    b'##contig=<ID=chr17,length=83257441>\n'
+    b'##contig=<ID=chr18,length=80373285>\n'
+    b'##contig=<ID=chr19,length=58617616>\n'
+    b'##contig=<ID=chr20,length=64444167>\n'
+    b'##contig=<ID=chr21,length=46709983>\n'
+    b'##contig=<ID=chr22,length=50818468>\n'
+    b'##contig=<ID=chrX,length=156040895>\n'
+    b'##contig=<ID=chrY,length=57227415>\n'
+    b'##contig=<ID=chrM,length=16569>\n'
+    b'#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t%s\n')
+
+VENDSIG_BY_STATUS = {
+    'known': 'Pathogenic',
+    'likley': 'Likely_pathogenic',
+    'unknown': 'Uncertain_significance',
+    'ambiguous': 'other'
+}
+
+_VCF_BATCH_SIZE = 1024
+
+
+def write_vcf(variant_records, specimen_name, fasta, vcf_out_file):
+    with open(vcf_out_file, 'wb', buffering=1 << 18) as vcf_file:
+        vcf_file.write(VCF_HEADER % (fasta.encode('utf-8'), specimen_name.encode('utf-8')))
+        vcf_file.flush()
+
+        # Pipe the body straight through the coordinate sort; its output lands
+        # in the file right after the header, so no unsorted intermediate ever
+        # touches disk.
+        sorter = subprocess.Popen(['sort', '-V', '-k1,1', '-k2,2n'],
+                                  stdin=subprocess.PIPE, stdout=vcf_file)
+
+        lines = []
+        for variant_dict, variant_name, chrom, offset, ref, alt, variant_read_count in variant_records:
+            vendsig = VENDSIG_BY_STATUS.get(variant_dict.get('@status', 'unknown'))
             dp = variant_dict['@depth']
             af = variant_dict['@allele-fraction']
-            gt = '1/1' if float(variant_dict['@allele-fraction']) > 0.9 else '0/1'
-            alt = int(round(int(dp) * float(af)))
-            ref = int(dp) - alt
-            ad = '{},{}'.format(ref, alt)
-            variant_name = '{}:c.{}'.format(transcript, cds_effect)
+            gt = '1/1' if float(af) > 0.9 else '0/1'
+            ad = '{},{}'.format(int(dp) - variant_read_count, variant_read_count)
+
+            lines.append(f'{chrom}\t{offset}\t.\t{ref}\t{alt}\t.\tPASS\t'
+                         f'DP={dp};AF={af};VENDSIG={vendsig}\tGT:DP:AD\t{gt}:{dp}:{ad}\n')
+            if len(lines) >= _VCF_BATCH_SIZE:
+                sorter.stdin.write(''.join(lines).encode('utf-8'))
+                del lines[:]
 
-            chrom, offset, ref, alt = hgvs_2_vcf(variant_name, genes, functional_effect, cds_effect, position_value, strand, fasta)
-            vcf_file.write('{}\t{}\t.\t{}\t{}\t.\tPASS\tDP={};AF={};VENDSIG={}\tGT:DP:AD\t{}:{}:{}\n'.format(chrom, offset, ref, alt, dp, af, vendsig, gt, dp, ad))
+        sorter.stdin.write(''.join(lines).encode('utf-8'))
+        sorter.stdin.close()
+        if sorter.wait() != 0:
+            raise subprocess.CalledProcessError(sorter.returncode, 'sort')
+
+    logger.info('Saved VCF to %s', vcf_out_file)
 
 
 def process(results_payload_dict, args):
@@ -1024,56 +1001,56 @@ def process(results_payload_dict, args):
     report = create_report(results_payload_dict, args.project_id,
                            subject_id, specimen_id, specimen_name, effective_date, args.file_url, args.sequence_id)
 
-    observations = []
-    if ('short-variants' in results_payload_dict['variant-report'].keys()):
+    variant_report = results_payload_dict['variant-report']
 
-        variants = []
+    observations = []
+    if ('short-variants' in variant_report):
 
-        if (results_payload_dict['variant-report']['short-variants'] is not None and
-            'short-variant' in results_payload_dict['variant-report']['short-variants'].keys()):
-            variants_dict = results_payload_dict['variant-report']['short-variants']['short-variant']
-            variants = variants_dict if isinstance(variants_dict, list) else [variants_dict]
+        variants = get_short_variants(results_payload_dict)
+        variant_records = resolve_variants(variants, args.fasta, args.genes)
 
         if (args.vcf_out_file is not None):
             specimen_name = get_specimen_name(results_payload_dict)
-            write_vcf(variants, specimen_name, args.fasta, args.genes, args.vcf_out_file)
+            write_vcf(variant_records, specimen_name, args.fasta, args.vcf_out_file)
 
-        observations = list(map(create_observation(args.fasta, args.genes, args.project_id, subject_id, specimen_id, specimen_name, sequence_id or args.sequence_id),
-                            variants))
+        observations = list(map(create_observation(args.project_id, subject_id, specimen_id, specimen_name, sequence_id or args.sequence_id),
+                            variant_records))
 
-    if ('copy-number-alterations' in results_payload_dict['variant-report'].keys()):
+    if ('copy-number-alterations' in variant_report):
 
         cnvs = []
 
-        if (results_payload_dict['variant-report']['copy-number-alterations'] is not None and
-            'copy-number-alteration' in results_payload_dict['variant-report']['copy-number-alterations'].keys()):
-            cnv_dict = results_payload_dict['variant-report']['copy-number-alterations']['copy-number-alteration']
+        if (variant_report['copy-number-alterations'] is not None and
+            'copy-number-alteration' in variant_report['copy-number-alterations']):
+            cnv_dict = variant_report['copy-number-alterations']['copy-number-alteration']
             cnvs = cnv_dict if isinstance(cnv_dict, list) else [cnv_dict]
 
         observations.extend(list(map(create_copy_number_observation(args.project_id, subject_id, specimen_id, specimen_name, sequence_id or args.sequence_id),
                                 cnvs)))
 
-    if ('rearrangements' in results_payload_dict['variant-report'].keys()):
+    if ('rearrangements' in variant_report):
 
         rearrangements = []
 
-        if (results_payload_dict['variant-report']['rearrangements'] is not None and
-            'rearrangement' in results_payload_dict['variant-report']['rearrangements'].keys()):
-            rearrangement_dict = results_payload_dict['variant-report']['rearrangements']['rearrangement']
+        if (variant_report['rearrangements'] is not None and
+            'rearrangement' in variant_report['rearrangements']):
+            rearrangement_dict = variant_report['rearrangements']['rearrangement']
             rearrangements = rearrangement_dict if isinstance(rearrangement_dict, list) else [rearrangement_dict]
 
         observations.extend(list(map(create_rearrangement_observation(args.project_id, subject_id, specimen_id, specimen_name, sequence_id or args.sequence_id),
                                 rearrangements)))
-    if ('biomarkers' in results_payload_dict['variant-report'].keys()):
+    if ('biomarkers' in variant_report):
 
-        if (results_payload_dict['variant-report']['biomarkers'] is not None and
-            'microsatellite-instability' in results_payload_dict['variant-report']['biomarkers'].keys()):
-            microsatellite_dict = results_payload_dict['variant-report']['biomarkers']['microsatellite-instability']
+        biomarkers = variant_report['biomarkers']
+
+        if (biomarkers is not None and
+            'microsatellite-instability' in biomarkers):
+            microsatellite_dict = biomarkers['microsatellite-instability']
             observations.append(create_microsatallite_observation(args.project_id, subject_id, specimen_id, effective_date, specimen_name, sequence_id or args.sequence_id)(microsatellite_dict))
 
-        if (results_payload_dict['variant-report']['biomarkers'] is not None and
-            'tumor-mutation-burden' in results_payload_dict['variant-report']['biomarkers'].keys()):
-            tumor_dict = results_payload_dict['variant-report']['biomarkers']['tumor-mutation-burden']
+        if (biomarkers is not None and
+            'tumor-mutation-burden' in biomarkers):
+            tumor_dict = biomarkers['tumor-mutation-burden']
             observations.append(create_tumor_mutation_observation(args.project_id, subject_id, specimen_id, effective_date, specimen_name, sequence_id or args.sequence_id)(tumor_dict))
 
 
@@ -1105,7 +1082,7 @@ def main():
     parser.add_argument('-s, --subject', dest='subject_id', required=False,
                         help='The ID of the subject/patient to link the resources to')
     parser.add_argument('-o, --output', dest='out_file',
-                        required=True, help='Path to write the FHIR JSON resources')
+                        required=False, help='Path to write the FHIR JSON resources', default=None)
     parser.add_argument('-f, --file', dest='file_url',
                         required=False, help='The URL to the PDF Report in the PHC')
     parser.add_argument('-d, --pdf-output', dest='pdf_out_file',
@@ -1116,29 +1093,31 @@ def main():
                         required=False, help='The sequence id to add to the Diagnostic Report', default=None)
 
     args = parser.parse_args()
+    if args.out_file is None and args.vcf_out_file is None:
+        parser.error('at least one of --output or --vcf-output is required')
+
     logger.info('Converting XML to FHIR with args: %s',
                 json.dumps(args.__dict__))
 
-    # pyfaidx has a bug with bgzipped files.  Unzip the genome for now
-    # https://github.com/mdshw5/pyfaidx/issues/125
     if (args.fasta.lower().endswith('.bgz') or
             args.fasta.lower().endswith('.gz')):
-        args.fasta = unzip(args.fasta)
-
-    xml_dict = read_xml(args.xml_file)
-    fhir_resources = process(
-        xml_dict['rr:ResultsReport']['rr:ResultsPayload'], args)
-    save_json(fhir_resources, args.out_file)
-    logger.info('Saved FHIR resources to %s', args.out_file)
-
-    if args.pdf_out_file is not None and 'ReportPDF' in xml_dict['rr:ResultsReport']['rr:ResultsPayload']:
-        pdf = base64.b64decode(xml_dict['rr:ResultsReport']['rr:ResultsPayload']['ReportPDF'])
-        with open(args.pdf_out_file, "w") as pdf_file:
-            pdf_file.write(pdf)
-        logger.info('Saved PDF report to %s', args.pdf_out_file)
-
-    if args.vcf_out_file is not None:
-        call(['/opt/app/sort.sh', args.vcf_out_file])
+        if args.fasta.lower().endswith('.bgz') and pyfaidx_supports_bgzf():
+            logger.info('pyfaidx reads bgzipped FASTA natively; skipping unzip of %s', args.fasta)
+        else:
+            args.fasta = unzip(args.fasta)
+
+    results_payload_dict = read_xml(args.xml_file, args.pdf_out_file)
+
+    if args.out_file is not None:
+        fhir_resources = process(results_payload_dict, args)
+        save_json(fhir_resources, args.out_file)
+        logger.info('Saved FHIR resources to %s', args.out_file)
+    else:
+        # VCF-only run: skip building and serializing FHIR resources entirely
+        specimen_name = get_specimen_name(results_payload_dict)
+        variants = get_short_variants(results_payload_dict)
+        variant_records = resolve_variants(variants, args.fasta, args.genes)
+        write_vcf(variant_records, specimen_name, args.fasta, args.vcf_out_file)
 
 
 if __name__ == '__main__':
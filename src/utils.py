@@ -1,3 +1,4 @@
+import functools
 import re
 
 try:
@@ -8,15 +9,27 @@ except ImportError:
     Fasta = None
 
 
-_COMP = dict(A='T', C='G', G='C', T='A', N='N',
-             a='t', c='g', g='c', t='a', n='n')
+_COMP_TABLE = str.maketrans('ACGTNacgtn', 'TGCANtgcan')
 
+_ALPHA_RE = re.compile(r'[A-Za-z]')
+_LEADING_ALPHA_RE = re.compile(r'^[A-Za-z]+')
+_LEADING_DIGITS_RE = re.compile(r'^[0-9]+')
 
-def parse_hgvs(hgvs_name, fasta, genes):
-    genome = Fasta(fasta, key_function=lambda x: 'chr{}'.format(x))
 
+@functools.lru_cache(maxsize=4)
+def load_genome(fasta):
+    return Fasta(fasta, key_function=lambda x: 'chr{}'.format(x))
+
+
+@functools.lru_cache(maxsize=4)
+def load_transcripts(genes):
     with open(genes) as infile:
-        transcripts = hgvs_utils.read_transcripts(infile)
+        return hgvs_utils.read_transcripts(infile)
+
+
+def parse_hgvs(hgvs_name, fasta, genes):
+    genome = load_genome(fasta)
+    transcripts = load_transcripts(genes)
 
     def get_transcript(name):
         return transcripts.get(name)
@@ -25,7 +38,7 @@ def parse_hgvs(hgvs_name, fasta, genes):
 
 
 def getRevComp(seq):
-    return ''.join(_COMP[base] for base in reversed(seq))
+    return seq[::-1].translate(_COMP_TABLE)
 
 
 def getSequence(genome, chrom, start, end):
@@ -33,17 +46,13 @@ def getSequence(genome, chrom, start, end):
 
 
 def parse_splice(cdsEffect, position, strand, fasta):
-    genome = Fasta(fasta, key_function=lambda x: 'chr{}'.format(x))
+    genome = load_genome(fasta)
 
-    [chr, sPos] = position.split(':')
+    [chr, sPos] = position.split(':', 1)
     startPos=int(sPos)
     if '>' in cdsEffect:
         mylist = cdsEffect.split('>')
-        mylist[0] = re.sub(r'[A-Za-z]','',mylist[0])
-        mytype = 'sub'
-    elif '>' in cdsEffect:
-        mylist = cdsEffect.split('>')
-        mylist[0] = re.sub(r'[A-Za-z]','',mylist[0])
+        mylist[0] = _ALPHA_RE.sub('', mylist[0])
         mytype = 'sub'
     elif 'delins' in cdsEffect:
         mylist = cdsEffect.split('delins')
@@ -60,7 +69,7 @@ def parse_splice(cdsEffect, position, strand, fasta):
     else:
         raise ValueError('ERROR: not sure how to interpret [{}]')
 
-    if strand == '-' and re.match(r'^[A-Za-z]+', mylist[1]):
+    if strand == '-' and _LEADING_ALPHA_RE.match(mylist[1]):
         mylist[1] = getRevComp(mylist[1])
     myrange = mylist[0].split('_')
     if len(myrange) == 1:
@@ -80,18 +89,18 @@ def parse_splice(cdsEffect, position, strand, fasta):
         sub = ['', '']
         for i in range(len(myrange)):
             if '+' in myrange[i]:
-                [main[i], sub[i]] = re.split('\+',myrange[i])
+                [main[i], sub[i]] = myrange[i].split('+')
             elif myrange[i].startswith('-'):
                 main[i] = myrange[i]
                 sub[i] = '0'
             elif '-' in myrange[i]:
-                [main[i], sub[i]] = re.split('-',myrange[i])
+                [main[i], sub[i]] = myrange[i].split('-')
                 sub[i] = '-' + sub[i]
             else:
                 main[i] = myrange[i]
                 sub[i] = '0'
 
-        if re.match(r'^[0-9]+', mylist[1]):
+        if _LEADING_DIGITS_RE.match(mylist[1]):
             seqlen = int(mylist[1])
         else:
             seqlen = len(mylist[1])
@@ -116,7 +125,7 @@ def parse_splice(cdsEffect, position, strand, fasta):
         if mytype == 'ins':
             if mylen != 2:
                 raise ValueError('ERROR: insertion but range is not 1 [{}]'.format(cdsEffect))
-            elif not re.match(r'^[A-Za-z]+', mylist[1]):
+            elif not _LEADING_ALPHA_RE.match(mylist[1]):
                 ref = getSequence(genome, chr, startPos, startPos)
                 mylist[1] = ref + ('N' * int(mylist[1]))
             else:
@@ -624,7 +624,7 @@ class ConvertTest(TestCase):
     @patch("src.convert.parse_hgvs")
     def test_convert_with_vcf(self, mock_parse_hgvs):
         mock_parse_hgvs.return_value = 'chr1', 100, 'A', 'T'
-        self.args.vcf_out_file = './tmp/subject.vcf'
+        self.args.vcf_out_file = './subject.vcf'
 
         fhir_resources = process(results_payload_dict, self.args)
         # should just create report resource
@@ -632,14 +632,14 @@ class ConvertTest(TestCase):
         self.assertEquals(fhir_resources[0]['resourceType'], 'DiagnosticReport')
         self.assertEquals(fhir_resources[1]['resourceType'], 'Observation')
         self.assertEquals(fhir_resources[2]['resourceType'], 'Observation')
-        self.assertTrue(os.path.isfile('./unsorted.vcf'))
-        self.assertTrue(filecmp.cmp('./unsorted.vcf', './test/data/expected.vcf', shallow=False))
+        self.assertTrue(os.path.isfile('./subject.vcf'))
+        self.assertTrue(filecmp.cmp('./subject.vcf', './test/data/expected.vcf', shallow=False))
 
 
     @patch("src.convert.parse_hgvs")
     def test_convert_with_no_variants(self, mock_parse_hgvs):
         mock_parse_hgvs.return_value = 'chr1', 100, 'A', 'T'
-        self.args.vcf_out_file = './tmp/subject.vcf'
+        self.args.vcf_out_file = './subject.vcf'
 
         no_variants_payload_dict = {
             'FinalReport': {
@@ -672,15 +672,15 @@ class ConvertTest(TestCase):
         # should just create report resource
         self.assertEquals(len(fhir_resources), 1)
         self.assertEquals(fhir_resources[0]['resourceType'], 'DiagnosticReport')
-        self.assertTrue(os.path.isfile('./unsorted.vcf'))
-        self.assertTrue(filecmp.cmp('./unsorted.vcf', './test/data/expected_none.vcf', shallow=False))
+        self.assertTrue(os.path.isfile('./subject.vcf'))
+        self.assertTrue(filecmp.cmp('./subject.vcf', './test/data/expected_none.vcf', shallow=False))
 
 
 
     @patch("src.convert.parse_hgvs")
     def test_convert_with_one_variant(self, mock_parse_hgvs):
         mock_parse_hgvs.return_value = 'chr1', 100, 'A', 'T'
-        self.args.vcf_out_file = './tmp/subject.vcf'
+        self.args.vcf_out_file = './subject.vcf'
 
         no_variants_payload_dict = {
             'FinalReport': {
@@ -737,5 +737,5 @@ class ConvertTest(TestCase):
         # should just create report resource
         self.assertEquals(len(fhir_resources), 3)
         self.assertEquals(fhir_resources[0]['resourceType'], 'DiagnosticReport')
-        self.assertTrue(os.path.isfile('./unsorted.vcf'))
-        self.assertTrue(filecmp.cmp('./unsorted.vcf', './test/data/expected.vcf', shallow=False))
+        self.assertTrue(os.path.isfile('./subject.vcf'))
+        self.assertTrue(filecmp.cmp('./subject.vcf', './test/data/expected.vcf', shallow=False))